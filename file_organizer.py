@@ -5,12 +5,19 @@ Supports only: PDF, DOC, DOCX, TXT, EPUB, CSV, XLSX, XLS, RTF, ODT, MD
 """
 
 import os
+import errno
 import re
 import shutil
+import hashlib
 import mimetypes
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
 from pathlib import Path
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
 # Document extraction libraries
@@ -26,6 +33,12 @@ except ImportError:
     print("Please run: pip install PyPDF2 python-docx openpyxl pandas ebooklib")
     exit(1)
 
+# Optional: faster C-backed PDF text extraction (falls back to PyPDF2)
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
 # Configuration
 LM_STUDIO_URL = "http://localhost:1234/v1/chat/completions"
 SUPPORTED_EXTENSIONS = {
@@ -33,43 +46,257 @@ SUPPORTED_EXTENSIONS = {
     '.xlsx', '.xls', '.rtf', '.odt', '.md'
 }
 MAX_CONTENT_LENGTH = 3000  # Characters to send to AI
+MAX_WORKERS = 8  # Files processed concurrently (LLM calls are I/O-bound)
+BATCH_SIZE = 8  # Files named and categorized per AI request
+CACHE_FILENAME = ".organizer_cache.json"  # AI replies cached in the root folder
+EXTRACT_CACHE_FILENAME = ".organizer_extract_cache.json"  # Extracted text cached in the root folder
+CACHE_MAX_ENTRIES = 4096
+QUICK_HASH_CHUNK = 64 * 1024  # Bytes hashed from each end of a file to spot duplicates
+
+_DEL_TABLE = str.maketrans('', '', '<>:"/\\|?*')  # Characters not allowed in Windows filenames
+_MULTISPACE = re.compile(r'\s+')
+_PDFIUM_LOCK = threading.Lock()  # PDFium is not thread-safe; only one worker may use it at a time
 
 # ============================================================================
 # FILE ORGANIZER CLASS
 # ============================================================================
 
 class FileOrganizer:
+    # Static instructions go in the system message, byte-identical on every call,
+    # so LM Studio can reuse the cached prompt prefix. Only per-file data follows.
+    NAME_RULES = """You are a file naming assistant. Given the content of a document, suggest a clear, descriptive filename.
+
+Rules:
+- Use only alphanumeric characters, spaces, hyphens, and underscores
+- Maximum 60 characters
+- Be specific and descriptive
+- Use title case (or appropriate case for Persian if content is in Persian)
+- Include relevant year/month if important (e.g., for reports, invoices)
+- NO file extension in your response
+- If content is in Persian/Farsi, you may suggest a Persian filename
+
+Respond with ONLY the new filename, nothing else."""
+
+    CATEGORY_RULES = """Categorize this document into ONE category.
+
+Choose from: Work, Personal, Finance, Medical, Education, Legal, Photos, Projects, Archive, Miscellaneous
+
+Respond with ONLY the category name (English or Persian), nothing else."""
+
+    COMBINED_RULES = """You are a file naming assistant. Given the content of a document, suggest a clear, descriptive filename and categorize the document into ONE category.
+
+Filename rules:
+- Use only alphanumeric characters, spaces, hyphens, and underscores
+- Maximum 60 characters
+- Be specific and descriptive
+- Use title case (or appropriate case for Persian if content is in Persian)
+- Include relevant year/month if important (e.g., for reports, invoices)
+- NO file extension in the filename
+- If content is in Persian/Farsi, you may suggest a Persian filename
+
+Choose the category from: Work, Personal, Finance, Medical, Education, Legal, Photos, Projects, Archive, Miscellaneous
+
+Respond with ONLY a JSON object like {"name": "New Filename", "category": "Work"}, nothing else."""
+
+    BATCH_RULES = """You are a file naming assistant. You will be given several documents, each starting with a "=== FILE n ===" line. For every document, suggest a clear, descriptive filename and categorize it into ONE category.
+
+Filename rules:
+- Use only alphanumeric characters, spaces, hyphens, and underscores
+- Maximum 60 characters
+- Be specific and descriptive
+- Use title case (or appropriate case for Persian if content is in Persian)
+- Include relevant year/month if important (e.g., for reports, invoices)
+- NO file extension in the filename
+- If content is in Persian/Farsi, you may suggest a Persian filename
+
+Choose the category from: Work, Personal, Finance, Medical, Education, Legal, Photos, Projects, Archive, Miscellaneous
+
+Respond with ONLY a JSON array with one object per file, like [{"idx": 1, "name": "New Filename", "category": "Work"}], nothing else."""
+
     def __init__(self, root_folder):
         self.root_folder = Path(root_folder)
-        self.rename_log = []
-        self.organize_log = []
+        self._log = None  # JSON-lines log of completed operations, open during live runs
+        self._log_lock = threading.Lock()
+        self._print_lock = threading.Lock()  # Keeps per-file lines from worker threads whole
+        self._move_lock = threading.Lock()  # Serializes collision checks with the rename/move itself
+        self._reserved = defaultdict(set)  # Folder -> casefolded filenames already claimed this run
+
+        # One pooled keep-alive session for all LM Studio calls
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2))
+        self.http.headers.update({"Connection": "keep-alive"})
+        self._fold_system = False  # Set once the server is found to reject system messages
+
+        # AI replies keyed by a hash of the request, shared by dry and live runs
+        self.cache_file = self.root_folder / CACHE_FILENAME
+        self._cache = self._load_cache(self.cache_file)
+        self._cache_lock = threading.Lock()
+
+        # Extracted text keyed by path, mtime and size, so unchanged files are
+        # never parsed twice, not even across runs
+        self.extract_cache_file = self.root_folder / EXTRACT_CACHE_FILENAME
+        self._content_cache = self._load_cache(self.extract_cache_file)
+
+        # Duplicate detection: quick hashes keyed by path, mtime and size, and AI
+        # answers keyed by (quick hash, field) so identical files share one answer
+        self._hash_cache = {}
+        self._answers = {}
+
+    def _load_cache(self, cache_file):
+        """Load a cache file from the root folder, if any"""
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache_file, cache):
+        """Trim a cache to its most recently used entries and write it to the root folder"""
+        with self._cache_lock:
+            while len(cache) > CACHE_MAX_ENTRIES:
+                del cache[next(iter(cache))]
+            data = dict(cache)
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Could not save cache {cache_file.name}: {e}")
+
+    def save_cache(self):
+        """Write cached AI replies and extracted text back to the root folder"""
+        self._write_cache(self.cache_file, self._cache)
+        self._write_cache(self.extract_cache_file, self._content_cache)
+
+    def _chat(self, payload, timeout, parse):
+        """Send a chat completion to LM Studio, reusing cached replies for identical requests"""
+        # parse turns the reply text into an answer; only replies that parse into a
+        # usable (not None) answer are cached, so bad replies are retried next run
+        key = hashlib.blake2b(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        with self._cache_lock:
+            if key in self._cache:
+                # Re-insert so the least recently used entries are trimmed first
+                self._cache[key] = self._cache.pop(key)
+                return parse(self._cache[key])
+
+        # cache_prompt asks llama.cpp-based servers to keep the KV cache of the shared
+        # system-prompt prefix; servers that don't know it ignore it. It is added here,
+        # outside the cache key, because it doesn't change the answer.
+        request = dict(payload, cache_prompt=True)
+        if self._fold_system:
+            request['messages'] = self.fold_system_prompt(payload['messages'])
+        response = self.http.post(LM_STUDIO_URL, json=request, timeout=timeout)
+
+        # Some chat templates (e.g. the stock Mistral-7B-Instruct v0.1/v0.2 one) only
+        # accept alternating user/assistant turns and reject a system message. Retry
+        # once with the rules folded into the user message, and keep doing that for
+        # the rest of the run if it works.
+        if response.status_code != 200 and not self._fold_system and payload['messages'][0]['role'] == 'system':
+            request['messages'] = self.fold_system_prompt(payload['messages'])
+            folded = self.http.post(LM_STUDIO_URL, json=request, timeout=timeout)
+            if folded.status_code == 200:
+                self._fold_system = True
+                response = folded
+
+        if response.status_code != 200:
+            self.report(f"AI request failed: {response.status_code}")
+            return None
+
+        reply = response.json()['choices'][0]['message']['content'].strip()
+        answer = parse(reply)
+        if answer is not None:
+            with self._cache_lock:
+                self._cache[key] = reply
+        return answer
+
+    def fold_system_prompt(self, messages):
+        """Merge a leading system message into the first user message"""
+        system, user = messages[0], messages[1]
+        return [{"role": "user", "content": f"{system['content']}\n\n{user['content']}"}] + messages[2:]
 
     def extract_text_content(self, file_path):
-        """Extract text content from various file types"""
+        """Extract text content, reusing earlier results for unchanged files"""
+        try:
+            stat = file_path.stat()
+            key = f"{file_path}|{stat.st_mtime_ns}|{stat.st_size}"
+        except OSError:
+            key = None
+
+        with self._cache_lock:
+            if key in self._content_cache:
+                self._content_cache[key] = self._content_cache.pop(key)
+                return self._content_cache[key]
+
+        content = self._extract_text_content(file_path)
+        if content is None:
+            # Failures aren't cached, so the file is retried on the next run
+            return f"File: {file_path.stem}"
+
+        if key is not None:
+            with self._cache_lock:
+                self._content_cache[key] = content
+        return content
+
+    def _extract_text_content(self, file_path):
+        """Extract text content from various file types (None if extraction fails)"""
         ext = file_path.suffix.lower()
         content = ""
 
         try:
             if ext == '.pdf':
-                with open(file_path, 'rb') as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    for page in pdf_reader.pages[:3]:
-                        content += page.extract_text() + " "
+                if pdfium is not None:
+                    with _PDFIUM_LOCK:
+                        pdf = pdfium.PdfDocument(str(file_path))
+                        try:
+                            for i in range(min(3, len(pdf))):
+                                content += pdf[i].get_textpage().get_text_range() + " "
+                                if len(content) >= MAX_CONTENT_LENGTH:
+                                    break
+                        finally:
+                            pdf.close()
+                else:
+                    with open(file_path, 'rb') as f:
+                        pdf_reader = PyPDF2.PdfReader(f)
+                        for page in pdf_reader.pages[:3]:
+                            content += page.extract_text() + " "
+                            if len(content) >= MAX_CONTENT_LENGTH:
+                                break
 
             elif ext == '.docx':
                 doc = docx.Document(file_path)
-                content = " ".join([para.text for para in doc.paragraphs[:20]])
+                paragraphs = []
+                length = 0
+                for para in doc.paragraphs[:20]:
+                    paragraphs.append(para.text)
+                    length += len(para.text) + 1
+                    if length >= MAX_CONTENT_LENGTH:
+                        break
+                content = " ".join(paragraphs)
 
             elif ext == '.txt' or ext == '.md':
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(MAX_CONTENT_LENGTH)
+                # UTF-8 uses at most 4 bytes per character, so this is always enough
+                with open(file_path, 'rb') as f:
+                    raw = f.read(MAX_CONTENT_LENGTH * 4)
+                content = raw.decode('utf-8', errors='ignore')
 
             elif ext in ['.csv']:
                 df = pd.read_csv(file_path, nrows=10)
                 content = f"CSV with columns: {', '.join(df.columns.tolist())}\n"
                 content += df.head(5).to_string()
 
-            elif ext in ['.xlsx', '.xls']:
+            elif ext == '.xlsx':
+                # Stream only the header and first rows instead of building a DataFrame
+                wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+                try:
+                    rows = list(itertools.islice(wb.active.iter_rows(values_only=True), 6))
+                finally:
+                    wb.close()
+                rows = [["" if cell is None else str(cell) for cell in row] for row in rows]
+                headers = rows[0] if rows else []
+                content = f"Excel with columns: {', '.join(headers)}\n"
+                content += "\n".join("\t".join(row) for row in rows[1:])
+
+            elif ext == '.xls':
+                # openpyxl cannot read the legacy .xls format
                 df = pd.read_excel(file_path, nrows=10)
                 content = f"Excel with columns: {', '.join(df.columns.tolist())}\n"
                 content += df.head(5).to_string()
@@ -80,90 +307,150 @@ class FileOrganizer:
                 content = f"EPUB Book: {title[0][0] if title else 'Unknown'}"
 
         except Exception as e:
-            print(f"Error extracting content from {file_path.name}: {e}")
-            content = f"File: {file_path.stem}"
+            self.report(f"Error extracting content from {file_path.name}: {e}")
+            return None
 
         return content[:MAX_CONTENT_LENGTH]
 
     def ask_ai_for_name(self, filename, content, file_date):
         """Ask local AI for a descriptive filename (supports Persian content)"""
         # AI prompt supports both English and Persian content
-        prompt = f"""You are a file naming assistant. Given the content of a document, suggest a clear, descriptive filename.
-
-Rules:
-- Use only alphanumeric characters, spaces, hyphens, and underscores
-- Maximum 60 characters
-- Be specific and descriptive
-- Use title case (or appropriate case for Persian if content is in Persian)
-- Include relevant year/month if important (e.g., for reports, invoices)
-- NO file extension in your response
-- If content is in Persian/Farsi, you may suggest a Persian filename
-
-Original filename: {filename}
+        prompt = f"""Original filename: {filename}
 File date: {file_date}
 Content preview:
-{content[:1000]}
-
-Respond with ONLY the new filename, nothing else."""
+{content[:1000]}"""
 
         try:
-            response = requests.post(
-                LM_STUDIO_URL,
-                json={
-                    "model": "mistral-7b-instruct",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,
-                    "max_tokens": 50
-                },
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                new_name = result['choices'][0]['message']['content'].strip()
-                new_name = re.sub(r'[<>:"/\\|?*]', '', new_name)
-                new_name = re.sub(r'\s+', ' ', new_name)
-                new_name = new_name[:60].strip()
-                return new_name
-            else:
-                print(f"AI request failed: {response.status_code}")
-                return None
+            return self._chat({
+                "model": "mistral-7b-instruct",
+                "messages": [
+                    {"role": "system", "content": self.NAME_RULES},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.3,
+                # A name fits on one line; Persian names need more tokens than English ones
+                "max_tokens": 30,
+                "stop": ["\n"]
+            }, timeout=30, parse=lambda reply: self.clean_ai_name(reply) or None)
         except Exception as e:
-            print(f"Error connecting to LM Studio: {e}")
+            self.report(f"Error connecting to LM Studio: {e}")
             return None
 
+    def clean_ai_name(self, new_name):
+        """Strip invalid characters and extra whitespace from an AI-suggested name"""
+        new_name = new_name.translate(_DEL_TABLE)
+        new_name = _MULTISPACE.sub(' ', new_name)
+        return new_name[:60].strip()
+
     def ask_ai_for_category(self, filename, content):
         """Ask AI to categorize the file (supports Persian content)"""
         # AI can respond in English or Persian based on content
-        prompt = f"""Categorize this document into ONE category.
+        prompt = f"""Content preview:
+{content[:800]}"""
 
-Choose from: Work, Personal, Finance, Medical, Education, Legal, Photos, Projects, Archive, Miscellaneous
+        try:
+            category = self._chat({
+                "model": "mistral-7b-instruct",
+                "messages": [
+                    {"role": "system", "content": self.CATEGORY_RULES},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.2,
+                # Persian category names need more tokens than English ones
+                "max_tokens": 10,
+                "stop": ["\n"]
+            }, timeout=20, parse=lambda reply: reply or None)
+            return category or "Miscellaneous"
+        except Exception as e:
+            return "Miscellaneous"
 
+    def ask_ai_combined(self, filename, content, file_date):
+        """Ask AI for both a filename and a category in one request (supports Persian content)"""
+        prompt = f"""Original filename: {filename}
+File date: {file_date}
 Content preview:
-{content[:800]}
+{content[:1000]}"""
 
-Respond with ONLY the category name (English or Persian), nothing else."""
+        def parse(reply):
+            # Models sometimes wrap the JSON in prose or code fences
+            match = re.search(r'\{.*\}', reply, re.DOTALL)
+            return self.parse_name_and_category(json.loads(match.group(0) if match else reply))
 
         try:
-            response = requests.post(
-                LM_STUDIO_URL,
-                json={
-                    "model": "mistral-7b-instruct",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.2,
-                    "max_tokens": 10
-                },
-                timeout=20
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                category = result['choices'][0]['message']['content'].strip()
-                return category
-            else:
-                return "Miscellaneous"
+            return self._chat({
+                "model": "mistral-7b-instruct",
+                "messages": [
+                    {"role": "system", "content": self.COMBINED_RULES},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.3,
+                "max_tokens": 80
+            }, timeout=30, parse=parse)
         except Exception as e:
-            return "Miscellaneous"
+            self.report(f"Could not parse combined AI reply for {filename}: {e}")
+            return None
+
+    def ask_ai_batch(self, items):
+        """Ask AI for filenames and categories of several files in one request"""
+        # Items are dicts with 'filename', 'content' and 'file_date'; the result list is
+        # aligned with them and holds None wherever the reply had no usable answer
+        prompt = "\n\n".join(
+            f"""=== FILE {idx} ===
+Original filename: {item['filename']}
+File date: {item['file_date']}
+Content preview:
+{item['content'][:600]}"""
+            for idx, item in enumerate(items, 1)
+        )
+
+        def parse(reply):
+            # Read each {...} on its own so a reply cut off by max_tokens still
+            # yields the files it finished
+            entries = []
+            for match in re.finditer(r'\{[^{}]*\}', reply):
+                try:
+                    entries.append(json.loads(match.group(0)))
+                except ValueError:
+                    continue
+            # Files are numbered from 1, but tolerate a model that counts from 0
+            offset = 0 if any(str(entry.get('idx')) == '0' for entry in entries) else 1
+            results = [None] * len(items)
+            for entry in entries:
+                try:
+                    idx = int(entry['idx']) - offset
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if 0 <= idx < len(items):
+                    results[idx] = self.parse_name_and_category(entry)
+            return results if any(results) else None
+
+        try:
+            results = self._chat({
+                "model": "mistral-7b-instruct",
+                "messages": [
+                    {"role": "system", "content": self.BATCH_RULES},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.3,
+                # Per file: a name (30) and a category (10) as in the single-file
+                # requests, plus ~25 for the JSON keys, idx and punctuation
+                "max_tokens": (30 + 10 + 25) * len(items)
+            }, timeout=30 + 15 * len(items), parse=parse)
+        except Exception as e:
+            self.report(f"Could not parse batch AI reply: {e}")
+            results = None
+        return results or [None] * len(items)
+
+    def parse_name_and_category(self, result):
+        """Validate a {"name", "category"} object from an AI reply"""
+        try:
+            new_name = self.clean_ai_name(str(result['name']))
+            category = str(result['category']).strip()
+        except (KeyError, TypeError):
+            return None
+        if not new_name or not category:
+            return None
+        return {'name': new_name, 'category': category}
 
     def get_file_date_string(self, file_path):
         """Get file modification date as string"""
@@ -174,89 +461,242 @@ Respond with ONLY the category name (English or Persian), nothing else."""
     def sanitize_filename(self, name):
         """Ensure filename is safe for Windows (supports Persian characters)"""
         # Remove invalid characters but keep Persian/Unicode
-        name = re.sub(r'[<>:"/\\|?*]', '', name)
+        name = name.translate(_DEL_TABLE)
         name = name.strip('. ')
         return name[:200]
 
-    def rename_file(self, file_path, dry_run=True):
-        """Rename a single file using AI"""
+    def report(self, message):
+        """Print one line of per-file output, safe to call from worker threads"""
+        with self._print_lock:
+            print(message)
+
+    def log_action(self, entry):
+        """Append one completed operation to the log, flushed right away"""
+        with self._log_lock:
+            if self._log is not None:
+                self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._log.flush()
+
+    def reserve_path(self, folder, candidates, current_path=None):
+        """Claim the first candidate filename that is free in folder (call with _move_lock held)"""
+        # Names planned this run are checked in memory first; the disk is only
+        # checked for names nobody has claimed yet
+        reserved = self._reserved[folder]
+        for filename in candidates:
+            path = folder / filename
+            if path == current_path or (filename.casefold() not in reserved and not path.exists()):
+                reserved.add(filename.casefold())
+                return path
+
+    def get_name(self, file_path):
+        """Ask AI for a file's new name, once per set of identical files"""
+        return self.shared_answer(file_path, 'name', lambda: self.ask_ai_for_name(
+            file_path.stem, self.extract_text_content(file_path), self.get_file_date_string(file_path)))
+
+    def rename_file(self, file_path, dry_run=True, new_name=None):
+        """Rename a single file using AI (or an already suggested name)"""
         if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
             return None
 
-        print(f"\nProcessing: {file_path.name}")
-
-        content = self.extract_text_content(file_path)
         file_date = self.get_file_date_string(file_path)
 
-        new_name = self.ask_ai_for_name(file_path.stem, content, file_date)
+        if new_name is None:
+            new_name = self.get_name(file_path)
 
         if not new_name:
-            print(f"  ⚠️  Could not generate name, skipping")
+            self.report(f"  ⚠️  Could not generate name for {file_path.name}, skipping")
             return None
 
         new_filename = f"{new_name} ({file_date}){file_path.suffix}"
         new_filename = self.sanitize_filename(new_filename)
-        new_path = file_path.parent / new_filename
 
-        counter = 1
-        while new_path.exists() and new_path != file_path:
-            new_filename = f"{new_name} ({file_date}) [{counter}]{file_path.suffix}"
-            new_path = file_path.parent / new_filename
-            counter += 1
+        with self._move_lock:
+            new_path = self.reserve_path(file_path.parent, itertools.chain(
+                [new_filename],
+                (f"{new_name} ({file_date}) [{counter}]{file_path.suffix}" for counter in itertools.count(1))
+            ), file_path)
 
-        print(f"  ✓ Suggested: {new_filename}")
+            self.report(f"  ✓ {file_path.name} → {new_path.name}")
 
-        if not dry_run and new_path != file_path:
-            try:
-                file_path.rename(new_path)
-                self.rename_log.append({'old': str(file_path), 'new': str(new_path)})
-                return new_path
-            except Exception as e:
-                print(f"  ✗ Error renaming: {e}")
-                return None
+            if not dry_run and new_path != file_path:
+                try:
+                    file_path.rename(new_path)
+                except Exception as e:
+                    self.report(f"  ✗ Error renaming {file_path.name}: {e}")
+                    return None
+                self.log_action({'action': 'rename', 'old': str(file_path), 'new': str(new_path)})
 
         return new_path
 
-    def organize_files(self, organize_root, dry_run=True):
+    def quick_hash(self, file_path):
+        """Cheap fingerprint of a file: its size plus its first and last 64 KB"""
+        try:
+            stat = file_path.stat()
+            key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+            if key in self._hash_cache:
+                return self._hash_cache[key]
+
+            digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=16)
+            with open(file_path, 'rb') as f:
+                digest.update(f.read(QUICK_HASH_CHUNK))
+                if stat.st_size > QUICK_HASH_CHUNK:
+                    f.seek(max(stat.st_size - QUICK_HASH_CHUNK, QUICK_HASH_CHUNK))
+                    digest.update(f.read(QUICK_HASH_CHUNK))
+        except OSError:
+            # Unreadable files are never treated as duplicates
+            return str(file_path)
+
+        self._hash_cache[key] = digest.hexdigest()
+        return self._hash_cache[key]
+
+    def split_duplicates(self, all_files):
+        """Split files into first copies and later copies of identical content"""
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            hashes = list(executor.map(self.quick_hash, all_files))
+
+        seen = set()
+        unique_files = []
+        duplicate_files = []
+        for file_path, file_hash in zip(all_files, hashes):
+            if file_hash in seen:
+                duplicate_files.append(file_path)
+            else:
+                seen.add(file_hash)
+                unique_files.append(file_path)
+
+        if duplicate_files:
+            print(f"Found {len(duplicate_files)} duplicate files (AI answers will be reused)")
+        return unique_files, duplicate_files
+
+    def shared_answer(self, file_path, field, ask):
+        """Ask AI once per set of identical files and reuse the answer for the copies"""
+        key = (self.quick_hash(file_path), field)
+        if key not in self._answers:
+            self._answers[key] = ask()
+        return self._answers[key]
+
+    def find_supported_files(self):
+        """List all supported files under the root folder"""
+        all_files = []
+        pending = deque([self.root_folder])
+        while pending:
+            try:
+                entries = os.scandir(pending.popleft())
+            except OSError:
+                continue  # Unreadable folders are skipped, as rglob did
+            with entries:
+                for entry in entries:
+                    # scandir already knows each entry's type on most filesystems,
+                    # so neither check below needs an extra stat call
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                        all_files.append(Path(entry.path))
+        return all_files
+
+    def organize_files(self, organize_root, dry_run=True, all_files=None):
         """Organize files into categorized folders"""
         print("\n" + "="*60)
         print("ORGANIZING FILES BY CATEGORY")
         print("="*60)
 
-        all_files = []
-        for file_path in self.root_folder.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                all_files.append(file_path)
+        if all_files is None:
+            all_files = self.find_supported_files()
 
         print(f"\nFound {len(all_files)} files to organize")
 
+        categories = self.collect_answers(all_files, self.get_category)
         for file_path in all_files:
-            content = self.extract_text_content(file_path)
-            category = self.ask_ai_for_category(file_path.name, content)
+            self.organize_file(file_path, organize_root, dry_run, category=categories[file_path])
+
+    def collect_answers(self, all_files, ask):
+        """Run ask for every file on the thread pool and return {file: answer}"""
+        # Copies run after the originals so they reuse their answers. Only the AI
+        # work is concurrent: callers then rename/move on this thread in input
+        # order, so [n] suffixes come out the same in the dry run and the live run.
+        unique_files, duplicate_files = self.split_duplicates(all_files)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            answers = dict(zip(unique_files, executor.map(ask, unique_files)))
+            answers.update(zip(duplicate_files, executor.map(ask, duplicate_files)))
+        return answers
+
+    def get_category(self, file_path):
+        """Ask AI for a file's category, once per set of identical files"""
+        return self.shared_answer(file_path, 'category', lambda: self.ask_ai_for_category(
+            file_path.name, self.extract_text_content(file_path)))
+
+    def organize_file(self, file_path, organize_root, dry_run=True, category=None):
+        """Move a single file into its AI-chosen category folder"""
+        if category is None:
+            category = self.get_category(file_path)
+
+        category_folder = Path(organize_root) / category
 
-            category_folder = Path(organize_root) / category
-
-            if not dry_run:
-                category_folder.mkdir(parents=True, exist_ok=True)
+        if not dry_run:
+            category_folder.mkdir(parents=True, exist_ok=True)
 
-                new_path = category_folder / file_path.name
-                counter = 1
-                while new_path.exists():
-                    new_path = category_folder / f"{file_path.stem} [{counter}]{file_path.suffix}"
-                    counter += 1
+            with self._move_lock:
+                new_path = self.reserve_path(category_folder, itertools.chain(
+                    [file_path.name],
+                    (f"{file_path.stem} [{counter}]{file_path.suffix}" for counter in itertools.count(1))
+                ))
 
                 try:
-                    shutil.move(str(file_path), str(new_path))
-                    print(f"  ✓ Moved to {category}: {file_path.name}")
-                    self.organize_log.append({
-                        'file': file_path.name,
-                        'from': str(file_path.parent),
-                        'to': str(new_path.parent)
-                    })
+                    # A same-volume move is a single rename; only cross-device moves copy
+                    try:
+                        os.replace(file_path, new_path)
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:
+                            raise
+                        shutil.move(str(file_path), str(new_path))
                 except Exception as e:
-                    print(f"  ✗ Error moving {file_path.name}: {e}")
-            else:
-                print(f"  → Would move to {category}: {file_path.name}")
+                    self.report(f"  ✗ Error moving {file_path.name}: {e}")
+                    return
+
+            self.report(f"  ✓ Moved to {category}: {file_path.name}")
+            self.log_action({
+                'action': 'organize',
+                'file': file_path.name,
+                'from': str(file_path.parent),
+                'to': str(new_path.parent)
+            })
+        else:
+            self.report(f"  → Would move to {category}: {file_path.name}")
+
+    def plan_batch(self, file_paths):
+        """Get new names and categories for a batch of files with one AI request"""
+        items = [{
+            'filename': file_path.stem,
+            'content': self.extract_text_content(file_path),
+            'file_date': self.get_file_date_string(file_path)
+        } for file_path in file_paths]
+
+        results = self.ask_ai_batch(items)
+        return [self.plan_file(file_path, result) for file_path, result in zip(file_paths, results)]
+
+    def plan_file(self, file_path, result=None):
+        """Get a file's new name and category, with one AI request where possible"""
+        def ask():
+            if result is not None:
+                return result
+            content = self.extract_text_content(file_path)
+            file_date = self.get_file_date_string(file_path)
+
+            # Falls back to the separate name/category requests if the combined reply is unusable
+            return self.ask_ai_combined(file_path.stem, content, file_date) or {}
+
+        answer = self.shared_answer(file_path, 'combined', ask)
+
+        # Ask for anything the combined reply lacked from the original file: in a
+        # dry run the renamed path doesn't exist
+        new_name = answer.get('name') or self.get_name(file_path)
+        category = answer.get('category') or self.get_category(file_path)
+        return new_name, category
+
+    def rename_and_organize_file(self, file_path, organize_root, dry_run, new_name, category):
+        """Rename a file and move it into its category folder"""
+        new_path = self.rename_file(file_path, dry_run, new_name=new_name)
+        self.organize_file(new_path or file_path, organize_root, dry_run, category=category)
 
     def process_all_files(self, rename=True, organize=False, dry_run=True):
         """Process all files in the folder"""
@@ -269,7 +709,7 @@ Respond with ONLY the category name (English or Persian), nothing else."""
 
         print("\nTesting LM Studio connection...")
         try:
-            test_response = requests.get("http://localhost:1234/v1/models", timeout=5)
+            test_response = self.http.get("http://localhost:1234/v1/models", timeout=5)
             if test_response.status_code == 200:
                 print("✓ LM Studio is running")
             else:
@@ -279,33 +719,63 @@ Respond with ONLY the category name (English or Persian), nothing else."""
             print("✗ Cannot connect to LM Studio. Make sure it's running on port 1234")
             return
 
-        all_files = []
-        for file_path in self.root_folder.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                all_files.append(file_path)
+        all_files = self.find_supported_files()
 
         print(f"\nFound {len(all_files)} supported files")
 
-        if rename:
+        # Names claimed by an earlier (dry) run on this organizer don't count
+        self._reserved = defaultdict(set)
+
+        if dry_run:
+            # Nothing is written in a dry run, not even the caches; main() reuses
+            # this organizer for the live run, so its answers carry over in memory
+            self.run_pipeline(all_files, rename, organize, dry_run)
+        else:
+            # Each operation is written as it happens, so an interrupted run keeps its log
+            log_file = self.root_folder / f"organization_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+            self._log = open(log_file, 'w', encoding='utf-8')
+            try:
+                self.run_pipeline(all_files, rename, organize, dry_run)
+            finally:
+                self._log.close()
+                self._log = None
+            print(f"\n✓ Log saved to: {log_file}")
+
+            self.save_cache()
+
+    def run_pipeline(self, all_files, rename, organize, dry_run):
+        """Rename and/or organize the given files"""
+        organize_root = self.root_folder / "Organized"
+
+        if rename and organize:
             print("\n" + "="*60)
-            print("RENAMING FILES")
+            print("RENAMING AND ORGANIZING FILES")
             print("="*60)
 
+            # Only first copies are sent to the AI in batches; the rest reuse their
+            # answers afterwards. Files are then renamed and moved in input order.
+            unique_files, duplicate_files = self.split_duplicates(all_files)
+            batches = [unique_files[i:i + BATCH_SIZE] for i in range(0, len(unique_files), BATCH_SIZE)]
+            plans = {}
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                for batch, batch_plans in zip(batches, executor.map(self.plan_batch, batches)):
+                    plans.update(zip(batch, batch_plans))
+                plans.update(zip(duplicate_files, executor.map(self.plan_file, duplicate_files)))
+
             for file_path in all_files:
-                self.rename_file(file_path, dry_run)
+                self.rename_and_organize_file(file_path, organize_root, dry_run, *plans[file_path])
 
-        if organize:
-            organize_root = self.root_folder / "Organized"
-            self.organize_files(organize_root, dry_run)
+        elif rename:
+            print("\n" + "="*60)
+            print("RENAMING FILES")
+            print("="*60)
 
-        if not dry_run:
-            log_file = self.root_folder / f"organization_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(log_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'renamed': self.rename_log,
-                    'organized': self.organize_log
-                }, f, indent=2, ensure_ascii=False)
-            print(f"\n✓ Log saved to: {log_file}")
+            names = self.collect_answers(all_files, self.get_name)
+            for file_path in all_files:
+                self.rename_file(file_path, dry_run, new_name=names[file_path])
+
+        elif organize:
+            self.organize_files(organize_root, dry_run, all_files)
 
 # ============================================================================
 # MAIN FUNCTION - ENGLISH UI ONLY
@@ -349,7 +819,6 @@ def main():
 
     if proceed == 'yes':
         print("\n🚀 Applying changes...")
-        organizer = FileOrganizer(folder_path)
         organizer.process_all_files(rename=rename, organize=organize, dry_run=False)
         print("\n✅ Done!")
     else: